@@ -0,0 +1,137 @@
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Weeks of buckets (and seen transaction ids) kept per tenant
+RETENTION_WEEKS = 5
+
+
+class TenantAggregates:
+    """Running revenue and customer totals for a single tenant, bucketed by day and week."""
+
+    def __init__(self):
+        self.daily_revenue = defaultdict(int)   # date -> amount in kobo
+        self.weekly_revenue = defaultdict(int)  # week start -> amount in kobo
+        self.weekly_transactions = defaultdict(int)
+        self.weekly_customers = defaultdict(set)
+        self.seen = {}  # transaction id -> week start, for idempotency
+        self.reconciled_at = None
+
+    def record(self, txn_id, amount, paid_on, customer):
+        if txn_id in self.seen:
+            return False
+        week = week_start(paid_on)
+        self.seen[txn_id] = week
+        self.daily_revenue[paid_on] += amount
+        self.weekly_revenue[week] += amount
+        self.weekly_transactions[week] += 1
+        if customer is not None:
+            self.weekly_customers[week].add(customer)
+        return True
+
+    def prune(self, today):
+        cutoff = week_start(today) - timedelta(weeks=RETENTION_WEEKS)
+        for bucket in (self.daily_revenue, self.weekly_revenue, self.weekly_transactions, self.weekly_customers):
+            for key in [k for k in bucket if k < cutoff]:
+                del bucket[key]
+        self.seen = {txn_id: week for txn_id, week in self.seen.items() if week >= cutoff}
+
+
+_tenants: dict[str, TenantAggregates] = defaultdict(TenantAggregates)
+_lock = threading.Lock()
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _paid_on(txn: dict) -> date:
+    timestamp = txn.get("paid_at") or txn.get("paidAt") or txn.get("created_at")
+    if not timestamp:
+        return _today()
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00")).date()
+
+
+def _customer_key(txn: dict):
+    customer = txn.get("customer") or {}
+    return customer.get("id") or customer.get("email")
+
+
+def record_charge(tenant_id: str, txn: dict) -> bool:
+    """
+    Add a successful Paystack charge to the tenant's running aggregates.
+
+    Args:
+        tenant_id: The tenant the charge belongs to.
+        txn: The transaction object from a `charge.success` event or the transaction list API.
+
+    Returns:
+        bool: True if the charge was recorded, False if it was already seen or unusable.
+    """
+    txn_id = txn.get("id") or txn.get("reference")
+    if txn_id is None or not isinstance(txn.get("amount"), int):
+        logger.warning("Skipping charge without id or amount for tenant %s", tenant_id)
+        return False
+
+    try:
+        paid_on = _paid_on(txn)
+    except (TypeError, ValueError, AttributeError):
+        logger.warning("Skipping charge %s with unparseable paid_at for tenant %s", txn_id, tenant_id)
+        return False
+    with _lock:
+        aggregates = _tenants[tenant_id]
+        if week_start(paid_on) not in aggregates.weekly_revenue:
+            # A new week's bucket is opening; drop buckets past retention
+            aggregates.prune(_today())
+        return aggregates.record(txn_id, txn["amount"], paid_on, _customer_key(txn))
+
+
+def reconcile(tenant_id: str, transactions: list[dict]) -> int:
+    """
+    Merge transactions pulled from the Paystack API into the tenant's aggregates.
+
+    Charges already delivered by webhook are ignored, so this only fills in
+    missed events. Once reconciled, the tenant's aggregates are used for reads.
+
+    Returns:
+        int: The number of previously missed charges that were recorded.
+    """
+    missed = sum(record_charge(tenant_id, txn) for txn in transactions)
+    with _lock:
+        _tenants[tenant_id].reconciled_at = datetime.now(timezone.utc)
+    if missed:
+        logger.warning("Reconciliation recorded %d missed charges for tenant %s", missed, tenant_id)
+    return missed
+
+
+def is_reconciled(tenant_id: str) -> bool:
+    """Return True once the tenant's aggregates have been seeded by a reconciliation."""
+    with _lock:
+        aggregates = _tenants.get(tenant_id)
+        return aggregates is not None and aggregates.reconciled_at is not None
+
+
+def get_weekly_totals(tenant_id: str) -> dict:
+    """
+    Return current and previous week totals for the tenant from its aggregates.
+
+    Returns:
+        dict: revenue, previous_revenue (in naira), customers and previous_customers.
+    """
+    current = week_start(_today())
+    previous = current - timedelta(weeks=1)
+    with _lock:
+        aggregates = _tenants[tenant_id]
+        return {
+            "revenue": aggregates.weekly_revenue.get(current, 0) / 100,
+            "previous_revenue": aggregates.weekly_revenue.get(previous, 0) / 100,
+            "customers": len(aggregates.weekly_customers.get(current, ())),
+            "previous_customers": len(aggregates.weekly_customers.get(previous, ())),
+        }
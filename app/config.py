@@ -11,10 +11,15 @@ class Settings(BaseSettings):
     API_PREFIX: str = "/api/v1"
     SECRET_KEY: str = secrets.token_urlsafe(32)
     DEBUG: bool = False
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    LOG_ACCESS_SAMPLE_EVERY: int = int(os.getenv("LOG_ACCESS_SAMPLE_EVERY", "10"))
     TESTING: bool = False
     Tick_URL: str = os.getenv("Tick_URL", "")
     TARGET_URL: str = os.getenv("TARGET_URL", "")
     TELEX_WEBHOOK_URL: str = os.getenv("TELEX_WEBHOOK_URL", "")
     PAYSTACK_API_KEY: str = os.getenv("PAYSTACK_API_KEY", "")
+    PAYSTACK_TIMEOUT: float = float(os.getenv("PAYSTACK_TIMEOUT", "10"))
+    INSIGHT_LATENCY_BUDGET: float = float(os.getenv("INSIGHT_LATENCY_BUDGET", "2"))
     
 settings = Settings()
@@ -0,0 +1,200 @@
+import atexit
+import contextvars
+import itertools
+import json
+import logging
+import queue
+import sys
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from app.config import settings
+
+tenant_id_var = contextvars.ContextVar("tenant_id", default=None)
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed via `extra`
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample_every"}
+
+_listener = None
+
+# Longest client-supplied id accepted from request headers
+MAX_HEADER_ID_LENGTH = 128
+
+# uvicorn gives these loggers their own synchronous handlers with propagate=False
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+@contextmanager
+def log_context(tenant_id=None, request_id=None):
+    """Attach tenant and request ids to every record logged inside the block."""
+    tokens = []
+    if tenant_id is not None:
+        tokens.append((tenant_id_var, tenant_id_var.set(tenant_id)))
+    if request_id is not None:
+        tokens.append((request_id_var, request_id_var.set(request_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Stamps records with the tenant and request ids of the calling context."""
+
+    def filter(self, record):
+        record.tenant_id = tenant_id_var.get()
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one in N records for high-volume events.
+
+    Callers opt in with `extra={"sample_every": N}`; records are counted per
+    message template, and warnings and above are never dropped.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._counters = {}
+
+    def filter(self, record):
+        every = getattr(record, "sample_every", None)
+        if not every or record.levelno >= logging.WARNING:
+            return True
+        counter = self._counters.setdefault(record.msg, itertools.count())
+        return next(counter) % every == 0
+
+
+class AccessLogSampler(logging.Filter):
+    """
+    Marks successful uvicorn access logs for sampling by `SamplingFilter`.
+
+    Access logs carry the response status as their last argument; 4xx and 5xx
+    responses are always kept.
+    """
+
+    def filter(self, record):
+        status = record.args[-1] if isinstance(record.args, tuple) and record.args else None
+        if isinstance(status, int) and status < 400:
+            record.sample_every = settings.LOG_ACCESS_SAMPLE_EVERY
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that hands records to the listener unformatted.
+
+    The stock handler merges args into the message on the calling thread; here
+    that work, and the JSON encoding, happen on the listener thread instead.
+    When the bounded queue is full, records are dropped rather than blocking
+    the caller, and the number dropped is attached to the next record that fits.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        # Called under the handler lock, so the counter needs no extra locking
+        if self.dropped:
+            record.dropped_records = self.dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.dropped = 0
+
+
+class JsonFormatter(logging.Formatter):
+    """Renders records as single-line JSON objects."""
+
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "tenant_id": getattr(record, "tenant_id", None),
+            "request_id": getattr(record, "request_id", None),
+        }
+        entry.update(
+            (key, value) for key, value in vars(record).items()
+            if key not in _RESERVED_ATTRS and key not in entry
+        )
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(level=None):
+    """
+    Route all logging through a background queue listener that writes JSON to stdout.
+
+    Safe to call more than once; only the first call installs the pipeline.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+    root.setLevel(level or settings.LOG_LEVEL)
+
+    # Send uvicorn's records, access logs included, through the queue as well
+    for name in UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+    logging.getLogger("uvicorn.access").addFilter(AccessLogSampler())
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def _header_id(headers, name):
+    # latin-1 decodes any byte sequence, so odd client headers can't fail the
+    # request; only printable ASCII is kept since the request id is echoed back
+    value = headers.get(name, b"")[:MAX_HEADER_ID_LENGTH].decode("latin-1")
+    return "".join(ch for ch in value if "!" <= ch <= "~") or None
+
+
+class RequestContextMiddleware:
+    """ASGI middleware that binds a request id for the request's logs."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = _header_id(headers, b"x-request-id") or uuid.uuid4().hex
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode("ascii"))]
+            await send(message)
+
+        with log_context(request_id=request_id):
+            await self.app(scope, receive, send_with_request_id)
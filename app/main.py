@@ -1,15 +1,27 @@
+import json
 import requests
-from fastapi import FastAPI, BackgroundTasks
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 from app.config import settings
+from app.logging_config import RequestContextMiddleware, log_context, setup_logging
 
 from app.routers.intergration_config import router as integration_router
 from app.routers.insights import router as insights_router
-from app.services import generate_insight
+from app import aggregates, scheduler
+from app.services import DEFAULT_TENANT, get_insight_within_budget, verify_paystack_signature
 from app.models import TickPayload
 
-app = FastAPI(title="Weekly-Business-Growth-Advisor")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs after uvicorn has applied its own logging config, so its loggers can be rerouted
+    setup_logging()
+    scheduler.start_reconciliation()
+    yield
+    scheduler.stop_reconciliation()
+
+app = FastAPI(title="Weekly-Business-Growth-Advisor", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,6 +31,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(RequestContextMiddleware)
+
 app.include_router(insights_router)
 app.include_router(integration_router)
 
@@ -29,12 +43,21 @@ TELEX_RETURN_URL = settings.TELEX_WEBHOOK_URL
 
 # Functions
 def process_tick_task(payload: TickPayload):
+    with log_context(tenant_id=DEFAULT_TENANT):
+        _process_tick_task(payload)
+
+def _process_tick_task(payload: TickPayload):
     try:
-        insight = generate_insight()
-        logger.info(f"Generated insight for {insight.metric}: {insight.observation}")
+        result = get_insight_within_budget()
+        insight = result.insight
+        logger.info("Generated insight for %s: %s", insight.metric, insight.observation)
+        
+        message = f" {insight.observation}\n {insight.recommendation}"
+        if result.stale:
+            message += f"\n (based on data from {int(result.age_seconds // 60)} minutes ago)"
         
         result_payload = {
-            "message": f" {insight.observation}\n {insight.recommendation}",
+            "message": message,
             "username": "Weekly Business Growth Advisor",
             "event_name": "Weekly Business Insight",
             "status": "success"
@@ -42,15 +65,42 @@ def process_tick_task(payload: TickPayload):
         
         response = requests.post(TELEX_RETURN_URL, json=result_payload, timeout=10)
         response.raise_for_status()
-        logger.info(f"Successfully posted insight to Telex. Status code: {response.status_code}")
+        logger.info("Successfully posted insight to Telex. Status code: %s", response.status_code)
     except Exception as e:
-        logger.error(f"Error posting insight to Telex: {e}")
+        logger.error("Error posting insight to Telex: %s", e)
 
 @app.post("/tick", status_code=202)
 def tick_endpoint(payload: TickPayload, background_tasks: BackgroundTasks):
     background_tasks.add_task(process_tick_task, payload)
     return {"status": "accepted"}
 
+@app.post("/webhooks/paystack")
+async def paystack_webhook(request: Request):
+    """
+    Receives Paystack events and folds `charge.success` charges into the
+    merchant's running aggregates. Redelivered events are ignored.
+    """
+    body = await request.body()
+    logger.info("Received Paystack webhook", extra={"sample_every": 100})
+    if not verify_paystack_signature(body, request.headers.get("x-paystack-signature", "")):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid signature")
+
+    try:
+        event = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON payload")
+    if not isinstance(event, dict):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid event payload")
+
+    if event.get("event") == "charge.success":
+        data = event.get("data") or {}
+        if not isinstance(data, dict):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid event payload")
+        with log_context(tenant_id=DEFAULT_TENANT):
+            recorded = aggregates.record_charge(DEFAULT_TENANT, data)
+        return {"status": "recorded" if recorded else "skipped"}
+    return {"status": "ignored"}
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_config=None)
\ No newline at end of file
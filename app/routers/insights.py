@@ -1,10 +1,11 @@
 from fastapi import APIRouter, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
 import logging
-from  app.services import generate_insight
+from  app.services import get_insight_within_budget
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +14,8 @@ class BusinessInsightResponse(BaseModel):
     observation: str
     recommendation: str
     generated_at: datetime
+    stale: bool = False
+    age_seconds: float = 0.0
 
 router = APIRouter(tags=["Insights"])
 
@@ -28,22 +31,26 @@ async def get_weekly_insight(
     
     try:
         
-        logger.info("Generating insight")
+        logger.info("Generating insight", extra={"sample_every": 100})
         
         
-        insight = generate_insight()
+        result = await run_in_threadpool(get_insight_within_budget)
+        insight = result.insight
         
         response.headers["Cache-Control"] = "max-age=3600"
+        response.headers["Age"] = str(int(result.age_seconds))
         
         
         return {
             "metric": insight.metric,
             "observation": insight.observation,
             "recommendation": insight.recommendation,
-            "generated_at": datetime.now()
+            "generated_at": result.generated_at,
+            "stale": result.stale,
+            "age_seconds": result.age_seconds
         }
     except Exception as e:
-        logger.error(f"Failed to generate insight: {str(e)}")
+        logger.error("Failed to generate insight: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to generate business insight. Please try again later."
@@ -76,11 +83,14 @@ async def get_metric_insight(
             detail=f"Metric '{metric_name}' not supported"
         )
     
-    insight = generate_insight()
+    result = await run_in_threadpool(get_insight_within_budget)
+    insight = result.insight
     
     return {
         "metric": insight.metric,
         "observation": insight.observation,
         "recommendation": insight.recommendation,
-        "generated_at": datetime.now()
+        "generated_at": result.generated_at,
+        "stale": result.stale,
+        "age_seconds": result.age_seconds
     }
\ No newline at end of file
@@ -1,43 +1,53 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 import app.services as services
+from app.logging_config import log_context, setup_logging
 import requests
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 from app.config import settings
 
 # Configuration
 TELEX_WEBHOOK_URL = settings.TELEX_WEBHOOK_URL
 MAX_RETRIES = 3
 RETRY_DELAY = 60  # seconds
+RECONCILE_INTERVAL = 15  # minutes
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Initialize scheduler with timezone awareness
 scheduler = BackgroundScheduler(timezone="UTC")
+# Separate scheduler for API processes that only reconcile, so starting and
+# stopping it never touches the weekly insight job
+reconciliation_scheduler = BackgroundScheduler(timezone="UTC")
 
 def send_weekly_insight():
     """
     Sends a weekly business growth insight to Telex via a webhook.
     
-    The insight is generated by `services.generate_insight()` and contains a
+    The insight is obtained via `services.get_insight_within_budget()`, which
+    falls back to the last good insight when Paystack is slow, and contains a
     metric observation and a recommended course of action. The insight is
     formatted as a Telex message with a title and body, and is posted to the
     Telex webhook URL with error handling and retries.
     """
+    with log_context(tenant_id=services.DEFAULT_TENANT):
+        _send_weekly_insight()
+
+def _send_weekly_insight():
     try:
         # Generate the business insight
-        insight = services.generate_insight()
-        logger.info(f"Generated insight for {insight.metric}: {insight.observation}")
+        result = services.get_insight_within_budget()
+        insight = result.insight
+        logger.info("Generated insight for %s: %s", insight.metric, insight.observation)
         
         # Format the payload with more structured information
-        payload = {
-            "text": f"# Weekly Business Insight: {insight.metric}\n\n"
-                   f"## 📊 Observation\n{insight.observation}\n\n"
-                   f"## ✅ Recommendation\n{insight.recommendation}\n\n"
-                   f"_Generated on {datetime.now().strftime('%Y-%m-%d at %H:%M')} UTC_"
-        }
+        text = (f"# Weekly Business Insight: {insight.metric}\n\n"
+                f"## 📊 Observation\n{insight.observation}\n\n"
+                f"## ✅ Recommendation\n{insight.recommendation}\n\n"
+                f"_Generated on {datetime.now().strftime('%Y-%m-%d at %H:%M')} UTC_")
+        if result.stale:
+            text += f"\n_Based on data from {int(result.age_seconds // 60)} minutes ago_"
+        payload = {"text": text}
         
         # Send the request with retry logic
         for attempt in range(MAX_RETRIES):
@@ -48,19 +58,57 @@ def send_weekly_insight():
                     timeout=10  # Set a reasonable timeout
                 )
                 response.raise_for_status()
-                logger.info(f"Successfully sent insight to Telex. Status code: {response.status_code}")
+                logger.info("Successfully sent insight to Telex. Status code: %s", response.status_code)
                 return
             except requests.exceptions.RequestException as e:
                 if attempt < MAX_RETRIES - 1:
-                    logger.warning(f"Attempt {attempt + 1} failed. Retrying in {RETRY_DELAY} seconds... Error: {str(e)}")
+                    logger.warning("Attempt %d failed. Retrying in %d seconds... Error: %s", attempt + 1, RETRY_DELAY, e)
                     import time
                     time.sleep(RETRY_DELAY)
                 else:
                     raise
     except Exception as e:
-        logger.error(f"Failed to send weekly insight: {str(e)}")
+        logger.error("Failed to send weekly insight: %s", e)
         # Consider alerting operations team here for critical failures
 
+def reconcile_aggregates():
+    """
+    Reconciles the webhook-fed aggregates against the Paystack pull API so
+    charges whose webhook events were missed still reach the weekly totals.
+    """
+    with log_context(tenant_id=services.DEFAULT_TENANT):
+        try:
+            missed = services.reconcile_aggregates()
+            logger.info("Reconciled aggregates. Missed charges recorded: %d", missed)
+        except Exception as e:
+            logger.error("Failed to reconcile aggregates: %s", e)
+
+def _schedule_reconciliation(target):
+    # Run once immediately so insight reads are served from warm aggregates
+    target.add_job(
+        reconcile_aggregates,
+        "interval",
+        minutes=RECONCILE_INTERVAL,
+        next_run_time=datetime.now(timezone.utc),
+        id="reconcile_aggregates",
+        replace_existing=True
+    )
+
+def start_reconciliation():
+    """
+    Starts only the aggregate reconciliation job, for processes such as the API
+    server that serve insight reads but do not send the weekly Telex message.
+    """
+    _schedule_reconciliation(reconciliation_scheduler)
+    if not reconciliation_scheduler.running:
+        reconciliation_scheduler.start()
+    logger.info("Aggregate reconciliation scheduled every %d minutes", RECONCILE_INTERVAL)
+
+def stop_reconciliation():
+    """Stops the reconciliation scheduler started by `start_reconciliation()`."""
+    if reconciliation_scheduler.running:
+        reconciliation_scheduler.shutdown(wait=False)
+
 def start():
     """
     Starts the scheduler to send weekly business growth insights to Telex.
@@ -71,6 +119,7 @@ def start():
     as a Telex message with a title and body, and are posted to the Telex webhook
     URL.
     """
+    setup_logging()
     try:
         # Add the job to the scheduler with misfire handling
         scheduler.add_job(
@@ -82,6 +131,7 @@ def start():
             id="weekly_business_insight",
             replace_existing=True
         )
+        _schedule_reconciliation(scheduler)
         
         # Start the scheduler
         scheduler.start()
@@ -90,5 +140,5 @@ def start():
         # Immediately run the job once for testing/verification (optional)
         # send_weekly_insight()
     except Exception as e:
-        logger.error(f"Failed to start scheduler: {str(e)}")
+        logger.error("Failed to start scheduler: %s", e)
         raise
\ No newline at end of file
@@ -1,23 +1,83 @@
 import os
+import contextvars
+import hmac
+import hashlib
+import threading
 import requests
-from datetime import datetime, timedelta
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, time, timedelta, timezone
 from dotenv import load_dotenv
+from app import aggregates
+from app.config import settings
+from app.logging_config import log_context
 from app.models import BusinessInsight
 import logging
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.ERROR)
 
-def get_sales_data():
+# Insights, aggregates and webhooks are all keyed on the single merchant whose
+# PAYSTACK_API_KEY is configured; Telex channels share that merchant's data.
+DEFAULT_TENANT = "default"
+
+
+@dataclass
+class InsightResult:
+    insight: BusinessInsight
+    generated_at: datetime
+    stale: bool = False
+    age_seconds: float = 0.0
+
+
+# Last successfully generated insight per tenant: tenant_id -> (insight, generated_at)
+_last_good: dict[str, tuple[BusinessInsight, datetime]] = {}
+# In-flight generation per tenant, so slow upstream calls are never stacked up
+_inflight: dict = {}
+_lock = threading.Lock()
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="insight-refresh")
+
+PAYSTACK_TRANSACTIONS_URL = "https://api.paystack.co/transaction"
+PAYSTACK_PAGE_SIZE = 100
+
+def _fetch_transactions(api_key, start, end):
     """
-    Retrieve sales data from the Paystack API and return it as a dictionary with two keys:
-    - revenue: the total revenue for the current week
-    - previous_revenue: the total revenue for the previous week
+    Fetch every successful Paystack transaction between `start` and `end`,
+    following the API's pagination until `meta.pageCount` is reached.
+    """
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    transactions = []
+    page = 1
+    while True:
+        params = {
+            "status": "success",
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "perPage": PAYSTACK_PAGE_SIZE,
+            "page": page
+        }
+        response = requests.get(PAYSTACK_TRANSACTIONS_URL, headers=headers, params=params, timeout=settings.PAYSTACK_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        transactions.extend(data['data'])
+
+        page_count = (data.get('meta') or {}).get('pageCount') or 1
+        if page >= page_count:
+            return transactions
+        page += 1
+
+def _pull_weekly_transactions():
+    """
+    Pull the current and previous week's transactions from the Paystack API.
+
+    Weeks start on Monday 00:00 UTC, matching the aggregates' weekly buckets.
 
     Returns:
-        dict: A dictionary with the revenue and previous revenue.
+        tuple: Lists of current week and previous week transactions.
 
     Raises:
         ValueError: If the Paystack API key is not found.
@@ -27,50 +87,76 @@ def get_sales_data():
     if not api_key:
         raise ValueError("Paystack API key not found in environment variables.")
 
-    today = datetime.now()
-    current_week_start = today - timedelta(days=today.weekday())
+    now = datetime.now(timezone.utc)
+    current_week_start = datetime.combine(aggregates.week_start(now.date()), time.min, tzinfo=timezone.utc)
     previous_week_start = current_week_start - timedelta(days=7)
 
-    base_url = "https://api.paystack.co/transaction"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+    try:
+        current = _fetch_transactions(api_key, current_week_start, now)
+        previous = _fetch_transactions(api_key, previous_week_start, current_week_start)
+        return current, previous
+    except requests.exceptions.RequestException as e:
+        logger.error("Error fetching data from Paystack API: %s", e)
+        raise
+
+def reconcile_aggregates(tenant_id=DEFAULT_TENANT):
+    """
+    Pull both weeks from Paystack and merge them into the tenant's aggregates,
+    recording any charges whose webhook events were missed.
+
+    Returns:
+        int: The number of missed charges that were recorded.
+    """
+    current, previous = _pull_weekly_transactions()
+    return aggregates.reconcile(tenant_id, current + previous)
+
+def get_sales_data(tenant_id=DEFAULT_TENANT):
+    """
+    Retrieve sales data for the tenant and return it as a dictionary with two keys:
+    - revenue: the total revenue for the current week
+    - previous_revenue: the total revenue for the previous week
+
+    Totals are read from the tenant's webhook-fed aggregates without calling
+    Paystack. Only on a cold start, before the scheduled reconciliation has
+    seeded the aggregates, are both weeks pulled from the Paystack API.
+
+    Returns:
+        dict: A dictionary with the revenue and previous revenue.
+
+    Raises:
+        ValueError: If the Paystack API key is not found.
+        requests.exceptions.RequestException: If the API request fails.
+    """
+    if aggregates.is_reconciled(tenant_id):
+        return aggregates.get_weekly_totals(tenant_id)
+
+    current, previous = _pull_weekly_transactions()
+    aggregates.reconcile(tenant_id, current + previous)
 
-    params = {
-        "status": "success"
+    return {
+        "revenue": sum(txn['amount'] for txn in current) / 100,
+        "previous_revenue": sum(txn['amount'] for txn in previous) / 100
     }
 
-    try:
-        # Get current and previous week revenue in a single API call
-        params["from"] = current_week_start.strftime("%Y-%m-%d")
-        params["to"] = today.strftime("%Y-%m-%d")
-        current_response = requests.get(base_url, headers=headers, params=params)
-        current_response.raise_for_status()
-        current_data = current_response.json()
-
-        params["from"] = previous_week_start.strftime("%Y-%m-%d")
-        params["to"] = (current_week_start - timedelta(days=1)).strftime("%Y-%m-%d")
-        previous_response = requests.get(base_url, headers=headers, params=params)
-        previous_response.raise_for_status()
-        previous_data = previous_response.json()
-
-        # Calculate current and previous week revenue
-        current_revenue = sum(txn['amount'] for txn in current_data['data']) / 100
-        previous_revenue = sum(txn['amount'] for txn in previous_data['data']) / 100
-
-        return {
-            "revenue": current_revenue,
-            "previous_revenue": previous_revenue
-        }
+def verify_paystack_signature(body: bytes, signature: str) -> bool:
+    """
+    Check a Paystack webhook's `x-paystack-signature` header.
 
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching data from Paystack API: {e}")
-        raise
+    Paystack signs the raw request body with HMAC-SHA512 using the secret key.
 
-def generate_insight():
+    Returns:
+        bool: True if the signature matches, False otherwise or if no key is configured.
+    """
+    api_key = os.getenv("PAYSTACK_API_KEY")
+    if not api_key or not signature:
+        return False
+    expected = hmac.new(api_key.encode(), body, hashlib.sha512).hexdigest()
+    # Compare bytes: headers are decoded as latin-1 and may hold non-ASCII characters
+    return hmac.compare_digest(expected.encode(), signature.encode("latin-1"))
+
+def generate_insight(tenant_id=DEFAULT_TENANT):
     try:
-        data = get_sales_data()
+        data = get_sales_data(tenant_id)
         revenue = data["revenue"]
         prev_revenue = data["previous_revenue"]
 
@@ -104,5 +190,78 @@ def generate_insight():
         )
 
     except Exception as e:
-        logger.error(f"Error generating insight: {e}")
-        raise
\ No newline at end of file
+        logger.error("Error generating insight: %s", e)
+        raise
+
+
+def _refresh(tenant_id):
+    """Generate a fresh insight and record it as the tenant's last good one."""
+    try:
+        entry = (generate_insight(tenant_id), datetime.now())
+        with _lock:
+            _last_good[tenant_id] = entry
+        return entry
+    finally:
+        with _lock:
+            _inflight.pop(tenant_id, None)
+
+
+def _stale_result(cached):
+    insight, generated_at = cached
+    age = (datetime.now() - generated_at).total_seconds()
+    return InsightResult(insight=insight, generated_at=generated_at, stale=True, age_seconds=age)
+
+
+def get_insight_within_budget(tenant_id=DEFAULT_TENANT, budget=None):
+    """
+    Return an insight for the tenant without waiting longer than the latency budget.
+
+    A fresh insight is generated if it completes within `budget` seconds
+    (defaults to `settings.INSIGHT_LATENCY_BUDGET`). If generation is too slow
+    or fails, the tenant's last good insight is served instead, marked stale
+    with its age, while a slow generation keeps running in the background and
+    refreshes the cache when it completes. Callers arriving while that refresh
+    is still running get the last good insight immediately.
+
+    Returns:
+        InsightResult: The insight together with its generation time and staleness.
+
+    Raises:
+        Exception: If fresh generation fails or times out and no previous
+            insight exists for the tenant.
+    """
+    if budget is None:
+        budget = settings.INSIGHT_LATENCY_BUDGET
+
+    # Log under the tenant whose data is read; the refresh thread inherits this context
+    with log_context(tenant_id=tenant_id):
+        return _get_insight_within_budget(tenant_id, budget)
+
+
+def _get_insight_within_budget(tenant_id, budget):
+    with _lock:
+        future = _inflight.get(tenant_id)
+        cached = _last_good.get(tenant_id)
+        if future is None:
+            # Carry the caller's log context (tenant/request ids) into the refresh thread
+            future = _refresh_executor.submit(contextvars.copy_context().run, _refresh, tenant_id)
+            _inflight[tenant_id] = future
+        elif cached is not None:
+            # A refresh is already running; serve the last good insight without waiting on it
+            return _stale_result(cached)
+
+    try:
+        insight, generated_at = future.result(timeout=budget)
+        return InsightResult(insight=insight, generated_at=generated_at)
+    except Exception as e:
+        with _lock:
+            cached = _last_good.get(tenant_id)
+        if cached is None:
+            if isinstance(e, FutureTimeoutError):
+                raise TimeoutError(f"Insight generation exceeded {budget}s budget") from e
+            raise
+
+        result = _stale_result(cached)
+        reason = "timed out" if isinstance(e, FutureTimeoutError) else "failed: %s" % e
+        logger.warning("Fresh insight for %s %s; serving insight from %.0fs ago", tenant_id, reason, result.age_seconds)
+        return result
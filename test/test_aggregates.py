@@ -0,0 +1,155 @@
+import hashlib
+import hmac
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+from app import aggregates, services
+from app.main import app, process_tick_task
+from app.models import TickPayload
+
+SECRET = "sk_test_secret"
+
+
+@pytest.fixture(autouse=True)
+def reset_aggregates():
+    aggregates._tenants.clear()
+    services._last_good.clear()
+    yield
+    aggregates._tenants.clear()
+    services._last_good.clear()
+
+
+@pytest.fixture
+def client():
+    with patch.dict("os.environ", {"PAYSTACK_API_KEY": SECRET}):
+        yield TestClient(app)
+
+
+def make_charge(txn_id, amount, days_ago=0, customer_id=1):
+    paid_at = datetime.now(timezone.utc) - timedelta(days=days_ago)
+    return {
+        "id": txn_id,
+        "amount": amount,
+        "paid_at": paid_at.isoformat().replace("+00:00", "Z"),
+        "customer": {"id": customer_id, "email": f"customer{customer_id}@example.com"},
+    }
+
+
+def signed_post(client, event):
+    body = json.dumps(event).encode()
+    signature = hmac.new(SECRET.encode(), body, hashlib.sha512).hexdigest()
+    return client.post(
+        "/webhooks/paystack",
+        content=body,
+        headers={"x-paystack-signature": signature, "Content-Type": "application/json"},
+    )
+
+
+def test_record_charge_updates_weekly_totals():
+    """Charges are added to the current week's revenue and customer counts"""
+    aggregates.record_charge("tenant-a", make_charge(1, 10000, customer_id=1))
+    aggregates.record_charge("tenant-a", make_charge(2, 5000, customer_id=1))
+    aggregates.record_charge("tenant-a", make_charge(3, 2500, customer_id=2))
+    aggregates.record_charge("tenant-a", make_charge(4, 20000, days_ago=7))
+
+    totals = aggregates.get_weekly_totals("tenant-a")
+
+    assert totals["revenue"] == 175.0
+    assert totals["customers"] == 2
+    assert totals["previous_revenue"] == 200.0
+    assert totals["previous_customers"] == 1
+    assert aggregates.get_weekly_totals("tenant-b")["revenue"] == 0
+
+
+def test_record_charge_is_idempotent():
+    """Redelivered charges are only counted once"""
+    assert aggregates.record_charge("tenant-a", make_charge(1, 10000)) is True
+    assert aggregates.record_charge("tenant-a", make_charge(1, 10000)) is False
+
+    assert aggregates.get_weekly_totals("tenant-a")["revenue"] == 100.0
+
+
+def test_reconcile_records_only_missed_charges():
+    """Reconciliation fills in charges missed by the webhook and marks the tenant fresh"""
+    aggregates.record_charge("tenant-a", make_charge(1, 10000))
+    assert not aggregates.is_reconciled("tenant-a")
+
+    missed = aggregates.reconcile("tenant-a", [make_charge(1, 10000), make_charge(2, 5000)])
+
+    assert missed == 1
+    assert aggregates.is_reconciled("tenant-a")
+    assert aggregates.get_weekly_totals("tenant-a")["revenue"] == 150.0
+
+
+def test_webhook_records_charge_success(client):
+    """A signed charge.success event updates the aggregates once"""
+    event = {"event": "charge.success", "data": make_charge(1, 10000)}
+
+    first = signed_post(client, event)
+    second = signed_post(client, event)
+
+    assert first.status_code == 200
+    assert first.json() == {"status": "recorded"}
+    assert second.json() == {"status": "skipped"}
+    assert aggregates.get_weekly_totals("default")["revenue"] == 100.0
+
+
+def test_webhook_ignores_other_events(client):
+    response = signed_post(client, {"event": "transfer.success", "data": {"id": 1, "amount": 500}})
+
+    assert response.json() == {"status": "ignored"}
+    assert aggregates.get_weekly_totals("default")["revenue"] == 0
+
+
+def test_webhook_rejects_non_object_payload(client):
+    """Signed payloads of the wrong shape are rejected with 400 so Paystack doesn't retry them"""
+    assert signed_post(client, [1, 2]).status_code == 400
+    assert signed_post(client, {"event": "charge.success", "data": [1]}).status_code == 400
+
+
+def test_webhook_skips_charge_with_unparseable_paid_at(client):
+    charge = dict(make_charge(1, 10000), paid_at="yesterday")
+
+    response = signed_post(client, {"event": "charge.success", "data": charge})
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "skipped"}
+    assert aggregates.get_weekly_totals("default")["revenue"] == 0
+
+
+def test_webhook_rejects_invalid_signature(client):
+    response = client.post(
+        "/webhooks/paystack",
+        json={"event": "charge.success", "data": make_charge(1, 10000)},
+        headers={"x-paystack-signature": "invalid"},
+    )
+
+    assert response.status_code == 401
+    assert aggregates.get_weekly_totals("default")["revenue"] == 0
+
+
+def test_webhook_rejects_non_ascii_signature(client):
+    response = client.post(
+        "/webhooks/paystack",
+        json={"event": "charge.success", "data": make_charge(1, 10000)},
+        headers={"x-paystack-signature": b"\xff\xfe"},
+    )
+
+    assert response.status_code == 401
+
+
+def test_webhook_charge_reaches_tick_insight(client):
+    """Charges pushed by webhook are what the /tick delivery reports on"""
+    aggregates.reconcile(services.DEFAULT_TENANT, [make_charge(1, 10000, days_ago=7)])
+    signed_post(client, {"event": "charge.success", "data": make_charge(2, 50000)})
+
+    payload = TickPayload(channel_id="chan-1", return_url="https://example.com", settings=[])
+    with patch('app.main.requests.post') as mock_post, patch('app.services.requests.get') as mock_get:
+        process_tick_task(payload)
+
+    mock_get.assert_not_called()
+    message = mock_post.call_args.kwargs['json']['message']
+    assert "Revenue grew significantly by 400.0% this week." in message
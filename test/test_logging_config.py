@@ -0,0 +1,166 @@
+import json
+import logging
+import queue
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+from app import logging_config
+from app.logging_config import (
+    ContextFilter,
+    DeferredQueueHandler,
+    JsonFormatter,
+    SamplingFilter,
+    log_context,
+)
+from app.main import app
+
+
+@pytest.fixture
+def installed_logging():
+    """Install the logging pipeline, then restore the root and uvicorn loggers"""
+    root = logging.getLogger()
+    access = logging.getLogger("uvicorn.access")
+    saved = (root.level, list(root.handlers), access.propagate, list(access.handlers), list(access.filters))
+
+    # Simulate uvicorn's default config: a private handler that doesn't propagate
+    access.handlers = [logging.StreamHandler()]
+    access.propagate = False
+
+    with patch.object(logging_config, "_listener", None), patch.object(logging_config.atexit, "register"):
+        logging_config.setup_logging()
+        queue_handler = next(h for h in root.handlers if isinstance(h, DeferredQueueHandler))
+        yield queue_handler
+        logging_config._listener.stop()
+
+    root.setLevel(saved[0])
+    root.handlers = saved[1]
+    access.propagate, access.handlers, access.filters = saved[2], saved[3], saved[4]
+
+
+def make_record(msg, *args, level=logging.INFO, **extra):
+    record = logging.LogRecord("app.test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_context_and_extras():
+    """Records are rendered as JSON carrying tenant and request ids"""
+    record = make_record("Generated insight for %s", "Revenue", charge_id=42)
+    with log_context(tenant_id="channel-1", request_id="req-1"):
+        ContextFilter().filter(record)
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["message"] == "Generated insight for Revenue"
+    assert entry["level"] == "INFO"
+    assert entry["tenant_id"] == "channel-1"
+    assert entry["request_id"] == "req-1"
+    assert entry["charge_id"] == 42
+
+
+def test_log_context_is_reset_after_block():
+    with log_context(tenant_id="channel-1"):
+        pass
+    record = make_record("message")
+    ContextFilter().filter(record)
+
+    assert record.tenant_id is None
+
+
+def test_sampling_filter_keeps_one_in_n():
+    """Sampled events are thinned out while warnings always pass"""
+    sampler = SamplingFilter()
+
+    kept = [sampler.filter(make_record("Generating insight", sample_every=10)) for _ in range(100)]
+    warnings = [sampler.filter(make_record("Slow", level=logging.WARNING, sample_every=10)) for _ in range(5)]
+
+    assert sum(kept) == 10
+    assert all(warnings)
+    assert sampler.filter(make_record("Unsampled"))
+
+
+def test_deferred_queue_handler_does_not_format():
+    """Message formatting is left to the listener thread"""
+    log_queue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(log_queue)
+
+    handler.handle(make_record("Status code: %s", 200))
+    record = log_queue.get_nowait()
+
+    assert record.msg == "Status code: %s"
+    assert record.args == (200,)
+
+
+def test_deferred_queue_handler_drops_when_full():
+    """A full queue drops records and reports the count on the next one enqueued"""
+    log_queue = queue.Queue(maxsize=1)
+    handler = DeferredQueueHandler(log_queue)
+
+    handler.handle(make_record("first"))
+    handler.handle(make_record("dropped"))
+    handler.handle(make_record("dropped"))
+    assert handler.dropped == 2
+
+    log_queue.get_nowait()
+    handler.handle(make_record("after"))
+    record = log_queue.get_nowait()
+
+    assert record.msg == "after"
+    assert record.dropped_records == 2
+    assert handler.dropped == 0
+
+
+def test_request_id_header_is_returned():
+    client = TestClient(app)
+
+    generated = client.get("/integration-config")
+    echoed = client.get("/integration-config", headers={"x-request-id": "req-123"})
+
+    assert generated.headers["x-request-id"]
+    assert echoed.headers["x-request-id"] == "req-123"
+
+
+def test_request_id_header_tolerates_invalid_bytes():
+    """Non-UTF-8 or oversized request ids never fail the request"""
+    client = TestClient(app)
+
+    response = client.get("/integration-config", headers={"x-request-id": b"\xff\xfe" + b"a" * 500})
+
+    assert response.status_code == 200
+    assert len(response.headers["x-request-id"]) <= 128
+
+
+def test_uvicorn_access_log_reaches_queue_handler(installed_logging):
+    """Access logs are rerouted from uvicorn's own handler into the queue pipeline"""
+    access = logging.getLogger("uvicorn.access")
+    assert access.handlers == []
+    assert access.propagate is True
+
+    with patch.object(installed_logging, "enqueue") as mock_enqueue, log_context(request_id="req-1"):
+        access.info('%s - "%s %s HTTP/%s" %d', "127.0.0.1:5000", "GET", "/", "1.1", 500)
+
+    record = mock_enqueue.call_args.args[0]
+    assert record.name == "uvicorn.access"
+    assert record.request_id == "req-1"
+    assert not hasattr(record, "sample_every")
+
+
+def test_uvicorn_access_log_success_is_sampled(installed_logging):
+    access = logging.getLogger("uvicorn.access")
+
+    with patch.object(installed_logging, "enqueue") as mock_enqueue:
+        for _ in range(20):
+            access.info('%s - "%s %s HTTP/%s" %d', "127.0.0.1:5000", "GET", "/", "1.1", 200)
+
+    assert mock_enqueue.call_count == 20 // logging_config.settings.LOG_ACCESS_SAMPLE_EVERY
+
+
+def test_logging_installed_by_lifespan():
+    """Logging is configured when the app starts, not when app.main is imported"""
+    with patch('app.main.setup_logging') as mock_setup, \
+            patch('app.main.scheduler.start_reconciliation'), \
+            patch('app.main.scheduler.stop_reconciliation'):
+        mock_setup.assert_not_called()
+        with TestClient(app):
+            mock_setup.assert_called_once()
@@ -6,7 +6,10 @@ import logging
 import time
 
 # Import the module to test
-from app.scheduler import scheduler, send_weekly_insight, start, RETRY_DELAY, MAX_RETRIES
+from app.scheduler import (
+    scheduler, send_weekly_insight, start, reconcile_aggregates, start_reconciliation, stop_reconciliation,
+    RETRY_DELAY, MAX_RETRIES, RECONCILE_INTERVAL
+)
 
 
 @pytest.fixture
@@ -132,9 +135,9 @@ def test_start_scheduler_success(mock_scheduler, caplog):
     # Call the function
     start()
     
-    # Verify the job was added correctly
-    mock_scheduler.add_job.assert_called_once()
-    args, kwargs = mock_scheduler.add_job.call_args
+    # Verify the weekly job and the reconciliation job were added
+    assert mock_scheduler.add_job.call_count == 2
+    args, kwargs = mock_scheduler.add_job.call_args_list[0]
     
     # Check the job configuration
     assert args[0] == send_weekly_insight
@@ -142,6 +145,13 @@ def test_start_scheduler_success(mock_scheduler, caplog):
     assert kwargs['hour'] == 9
     assert kwargs['id'] == 'weekly_business_insight'
     assert kwargs['replace_existing'] is True
+
+    args, kwargs = mock_scheduler.add_job.call_args_list[1]
+    assert args[0] == reconcile_aggregates
+    assert args[1] == 'interval'
+    assert kwargs['minutes'] == RECONCILE_INTERVAL
+    assert kwargs['id'] == 'reconcile_aggregates'
+    assert kwargs['next_run_time'] is not None
     
     # Verify scheduler was started
     mock_scheduler.start.assert_called_once()
@@ -182,4 +192,38 @@ def test_formatted_timestamp(mock_datetime, mock_services, mock_requests):
     # Verify the timestamp formatting in the payload
     args, kwargs = mock_requests.call_args
     payload = kwargs['json']
-    assert "_Generated on 2025-02-21 at 09:00 UTC_" in payload['text']
\ No newline at end of file
+    assert "_Generated on 2025-02-21 at 09:00 UTC_" in payload['text']
+
+
+def test_reconcile_aggregates_job(caplog):
+    """Test the reconciliation job reports missed charges and swallows failures"""
+    caplog.set_level(logging.INFO)
+
+    with patch('app.services.reconcile_aggregates', return_value=3) as mock_reconcile:
+        reconcile_aggregates()
+    mock_reconcile.assert_called_once()
+    assert "Missed charges recorded: 3" in caplog.text
+
+    with patch('app.services.reconcile_aggregates', side_effect=requests.exceptions.Timeout("slow")):
+        reconcile_aggregates()
+    assert "Failed to reconcile aggregates" in caplog.text
+
+
+def test_start_reconciliation_uses_separate_scheduler(mock_scheduler):
+    """Test the API's reconciliation scheduler never starts or stops the weekly one"""
+    with patch('app.scheduler.reconciliation_scheduler') as mock_reconciliation:
+        mock_reconciliation.running = False
+        start_reconciliation()
+
+        args, kwargs = mock_reconciliation.add_job.call_args
+        assert args[0] == reconcile_aggregates
+        assert kwargs['id'] == 'reconcile_aggregates'
+        mock_reconciliation.start.assert_called_once()
+
+        mock_reconciliation.running = True
+        stop_reconciliation()
+        mock_reconciliation.shutdown.assert_called_once_with(wait=False)
+
+    mock_scheduler.add_job.assert_not_called()
+    mock_scheduler.start.assert_not_called()
+    mock_scheduler.shutdown.assert_not_called()
@@ -1,10 +1,21 @@
 import unittest
 from unittest.mock import patch, MagicMock
 import os
-from app.services import get_sales_data, generate_insight
+import threading
+from datetime import datetime, timedelta, timezone
+import app.services as services
+from app.logging_config import log_context, tenant_id_var
+from app.models import BusinessInsight
+from app.services import get_sales_data, generate_insight, get_insight_within_budget
 
 class TestGetSalesData(unittest.TestCase):
 
+    def setUp(self):
+        services.aggregates._tenants.clear()
+
+    def tearDown(self):
+        services.aggregates._tenants.clear()
+
     @patch('app.services.requests.get')
     @patch('app.services.os.getenv')
     def test_get_sales_data(self, mock_getenv, mock_requests_get):
@@ -57,6 +68,43 @@ class TestGetSalesData(unittest.TestCase):
         self.assertEqual(data['previous_revenue'], 300.0)
 
 
+    @patch('app.services.requests.get')
+    def test_get_sales_data_reads_reconciled_aggregates(self, mock_requests_get):
+        # Reconciled tenants are served from the webhook-fed aggregates
+        paid_at = datetime.now(timezone.utc).isoformat()
+        services.aggregates.reconcile("tenant-agg", [{'id': 1, 'amount': 25000, 'paid_at': paid_at}])
+
+        data = get_sales_data("tenant-agg")
+
+        mock_requests_get.assert_not_called()
+        self.assertEqual(data['revenue'], 250.0)
+        self.assertEqual(data['previous_revenue'], 0)
+
+    @patch('app.services.requests.get')
+    @patch('app.services.os.getenv')
+    def test_reconcile_aggregates_follows_pagination(self, mock_getenv, mock_requests_get):
+        # Every page of both weeks is merged into the aggregates
+        mock_getenv.return_value = "dummy_api_key"
+        paid_at = datetime.now(timezone.utc).isoformat()
+
+        def page(ids, page_count):
+            response = MagicMock()
+            response.json.return_value = {
+                'data': [{'id': i, 'amount': 10000, 'paid_at': paid_at} for i in ids],
+                'meta': {'pageCount': page_count}
+            }
+            return response
+
+        mock_requests_get.side_effect = [page([1, 2], 2), page([3], 2), page([], 1)]
+
+        missed = services.reconcile_aggregates("tenant-pages")
+
+        self.assertEqual(missed, 3)
+        self.assertEqual(mock_requests_get.call_count, 3)
+        self.assertEqual(mock_requests_get.call_args_list[1].kwargs['params']['page'], 2)
+        self.assertTrue(mock_requests_get.call_args_list[0].kwargs['params']['from'].endswith('+00:00'))
+        self.assertEqual(get_sales_data("tenant-pages")['revenue'], 300.0)
+
     @patch('app.services.get_sales_data')
     def test_generate_insight_with_api_error(self, mock_get_sales_data):
         # Mock API error
@@ -67,7 +115,85 @@ class TestGetSalesData(unittest.TestCase):
         # Test generate_insight function with API error
         with self.assertRaises(Exception):
             generate_insight()
-            
-            
+
+
+
+class TestGetInsightWithinBudget(unittest.TestCase):
+
+    def setUp(self):
+        services._last_good.clear()
+        services._inflight.clear()
+        self.insight = BusinessInsight(metric="Revenue", observation="old", recommendation="keep going")
+
+    @patch('app.services.generate_insight')
+    def test_fresh_insight_within_budget(self, mock_generate):
+        mock_generate.return_value = self.insight
+
+        result = get_insight_within_budget("tenant-a", budget=1)
+
+        self.assertIs(result.insight, self.insight)
+        self.assertFalse(result.stale)
+        self.assertIn("tenant-a", services._last_good)
+
+    @patch('app.services.generate_insight')
+    def test_slow_upstream_serves_last_good_and_refreshes(self, mock_generate):
+        generated_at = datetime.now() - timedelta(hours=1)
+        services._last_good["tenant-a"] = (self.insight, generated_at)
+        release = threading.Event()
+        fresh = BusinessInsight(metric="Revenue", observation="new", recommendation="scale up")
+
+        def slow_generate(tenant_id):
+            release.wait(5)
+            return fresh
+        mock_generate.side_effect = slow_generate
+
+        result = get_insight_within_budget("tenant-a", budget=0.01)
+
+        self.assertTrue(result.stale)
+        self.assertIs(result.insight, self.insight)
+        self.assertGreaterEqual(result.age_seconds, 3600)
+
+        # Later callers don't wait on the in-flight refresh
+        future = services._inflight["tenant-a"]
+        with patch.object(future, 'result', side_effect=AssertionError("waited on refresh")):
+            again = get_insight_within_budget("tenant-a", budget=5)
+        self.assertTrue(again.stale)
+        self.assertIs(again.insight, self.insight)
+        self.assertEqual(mock_generate.call_count, 1)
+
+        # The background refresh updates the cache once upstream responds
+        release.set()
+        future.result(timeout=5)
+        self.assertIs(services._last_good["tenant-a"][0], fresh)
+
+    @patch('app.services.generate_insight')
+    def test_failure_serves_last_good(self, mock_generate):
+        services._last_good["tenant-a"] = (self.insight, datetime.now())
+        mock_generate.side_effect = Exception('API error')
+
+        result = get_insight_within_budget("tenant-a", budget=1)
+
+        self.assertTrue(result.stale)
+        self.assertIs(result.insight, self.insight)
+
+    @patch('app.services.generate_insight')
+    def test_refresh_logs_under_tenant_read(self, mock_generate):
+        # The refresh thread logs under the tenant whose data it reads, not the caller's
+        seen = []
+        mock_generate.side_effect = lambda tenant_id: seen.append(tenant_id_var.get()) or self.insight
+
+        with log_context(tenant_id="spoofed"):
+            get_insight_within_budget("tenant-a", budget=1)
+
+        self.assertEqual(seen, ["tenant-a"])
+
+    @patch('app.services.generate_insight')
+    def test_failure_without_last_good_raises(self, mock_generate):
+        mock_generate.side_effect = Exception('API error')
+
+        with self.assertRaises(Exception):
+            get_insight_within_budget("tenant-a", budget=1)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file